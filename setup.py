@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 from pathlib import Path
 
-import setuptools
 from setuptools import setup
 
 this_dir = Path(__file__).parent
@@ -9,8 +8,7 @@ this_dir = Path(__file__).parent
 requirements = []
 requirements_path = this_dir / "requirements.txt"
 if requirements_path.is_file():
-    with open(requirements_path, "r", encoding="utf-8") as requirements_file:
-        requirements = requirements_file.read().splitlines()
+    requirements = requirements_path.read_text(encoding="utf-8").splitlines()
 
 module_name = "wyoming_faster_whisper"
 module_dir = this_dir / module_name
@@ -30,19 +28,22 @@ setup(
     author="Michael Hansen",
     author_email="mike@rhasspy.org",
     license="MIT",
-    packages=setuptools.find_packages(),
+    packages=[module_name],
     package_data={module_name: [str(p.relative_to(module_dir)) for p in data_files]},
     install_requires=requirements,
+    extras_require={
+        "uvloop": ["uvloop; platform_system != 'Windows'"],
+        "soxr": ["soxr"],
+        "psutil": ["psutil"],
+    },
+    python_requires=">=3.11",
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
         "Topic :: Text Processing :: Linguistic",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
-        "Programming Language :: Python :: 3.9",
-        "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
     ],
     keywords="rhasspy wyoming whisper stt",
     entry_points={
@@ -0,0 +1,285 @@
+"""Tests for batching in wyoming-faster-whisper"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+from faster_whisper import WhisperModel
+from faster_whisper.tokenizer import _LANGUAGE_CODES
+
+from wyoming_faster_whisper.dispatcher import BatchDispatcher
+
+_RATE = 16000
+
+# First sample of the audio selects what the fake model decodes
+_SPEECH = 0.1
+_SILENCE = 0.2
+_UNLIKELY = 0.3
+
+
+class FakeHfTokenizer:
+    """One token per word, with special tokens after <|endoftext|>."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {"<|endoftext|>": 50257}
+        self._words: Dict[int, str] = {}
+
+    def token_to_id(self, token: str) -> int:
+        if token not in self._ids:
+            self._ids[token] = len(self._ids) + 50257
+
+        return self._ids[token]
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> Any:
+        ids = []
+        for word in text.split():
+            word_id = self._ids.get(word)
+            if word_id is None:
+                word_id = len(self._words)
+                self._ids[word] = word_id
+                self._words[word_id] = word
+
+            ids.append(word_id)
+
+        return SimpleNamespace(ids=ids)
+
+    def decode(self, ids: List[int]) -> str:
+        return "".join(" " + self._words[word_id] for word_id in ids)
+
+
+class FakeFeatureExtractor:
+    sampling_rate = _RATE
+    n_samples = 30 * _RATE
+
+    def __call__(self, audio: np.ndarray) -> np.ndarray:
+        return np.full((1, len(audio) // 160), audio[0], dtype=np.float32)
+
+
+class FakeCt2Model:
+    """Decodes the first feature of each item into text."""
+
+    def __init__(self, hf_tokenizer: FakeHfTokenizer, is_multilingual: bool):
+        self.hf_tokenizer = hf_tokenizer
+        self.is_multilingual = is_multilingual
+        self.prompts: List[List[List[int]]] = []
+
+    def detect_language(self, encoder_output: np.ndarray) -> List[Any]:
+        return [[("<|de|>", 0.9)] for _ in encoder_output]
+
+    def generate(self, encoder_output: np.ndarray, prompts, **kwargs) -> List[Any]:
+        self.prompts.append(prompts)
+        results = []
+        for features in encoder_output:
+            marker = round(float(features[0][0]), 1)
+            words = self.hf_tokenizer.encode(" batched").ids
+            if marker == _SILENCE:
+                results.append(
+                    SimpleNamespace(
+                        sequences_ids=[[]], scores=[-2.0], no_speech_prob=0.9
+                    )
+                )
+            elif marker == _UNLIKELY:
+                results.append(
+                    SimpleNamespace(
+                        sequences_ids=[words], scores=[-3.0], no_speech_prob=0.1
+                    )
+                )
+            else:
+                results.append(
+                    SimpleNamespace(
+                        sequences_ids=[words], scores=[-0.1], no_speech_prob=0.1
+                    )
+                )
+
+        return results
+
+
+class FakeWhisperModel:
+    max_length = 448
+    get_prompt = WhisperModel.get_prompt
+
+    def __init__(self, is_multilingual: bool = True) -> None:
+        self.hf_tokenizer = FakeHfTokenizer()
+        self.feature_extractor = FakeFeatureExtractor()
+        self.model = FakeCt2Model(self.hf_tokenizer, is_multilingual)
+        self.transcribe_calls = 0
+
+    def encode(self, features: np.ndarray) -> np.ndarray:
+        return features
+
+    def transcribe(self, audio: np.ndarray, language=None, **kwargs) -> Any:
+        if (language is not None) and (language not in _LANGUAGE_CODES):
+            raise ValueError(f"'{language}' is not a valid language code")
+
+        self.transcribe_calls += 1
+        return iter([SimpleNamespace(text=" alone")]), None
+
+
+def _audio(marker: float = _SPEECH, seconds: float = 1) -> np.ndarray:
+    return np.full(int(seconds * _RATE), marker, dtype=np.float32)
+
+
+async def _transcribe_all(
+    dispatcher: BatchDispatcher, requests: List[Dict[str, Any]]
+) -> List[Any]:
+    run_task = asyncio.create_task(dispatcher.run())
+    try:
+        return await asyncio.gather(
+            *(dispatcher.transcribe(**request) for request in requests),
+            return_exceptions=True,
+        )
+    finally:
+        run_task.cancel()
+
+
+def _make_dispatcher(model: FakeWhisperModel) -> BatchDispatcher:
+    # Wait so every request in a test lands in the same batch
+    return BatchDispatcher(
+        model,  # type: ignore[arg-type]
+        beam_size=1,
+        max_wait_ms=100,
+        vad_filter=False,
+    )
+
+
+@pytest.mark.asyncio
+async def test_single_request_uses_transcribe() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(_make_dispatcher(model), [{"audio": _audio()}])
+
+    assert texts == [" alone"]
+    assert model.transcribe_calls == 1
+    assert not model.model.prompts
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched() -> None:
+    model = FakeWhisperModel()
+    segments: List[str] = []
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {"audio": _audio(), "language": "en", "on_segment": segments.append},
+            {"audio": _audio(), "language": "en"},
+            {"audio": _audio(), "language": "en"},
+        ],
+    )
+
+    assert texts == [" batched"] * 3
+    assert segments == [" batched"]
+    assert model.transcribe_calls == 0
+    assert len(model.model.prompts) == 1
+    assert len(model.model.prompts[0]) == 3
+
+
+@pytest.mark.asyncio
+async def test_requests_are_grouped_by_prompt() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {"audio": _audio(), "language": "en"},
+            {"audio": _audio(), "language": "en", "initial_prompt": "lamp"},
+            {"audio": _audio(), "language": "en"},
+            {"audio": _audio(), "language": "en", "initial_prompt": "lamp"},
+        ],
+    )
+
+    assert texts == [" batched"] * 4
+    assert sorted(len(prompts) for prompts in model.model.prompts) == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_language_is_detected_for_batch() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [{"audio": _audio(), "language": "en"}, {"audio": _audio()}],
+    )
+
+    assert texts == [" batched"] * 2
+    en_prompt, detected_prompt = model.model.prompts[0]
+    assert model.hf_tokenizer.token_to_id("<|en|>") in en_prompt
+    assert model.hf_tokenizer.token_to_id("<|de|>") in detected_prompt
+
+
+@pytest.mark.asyncio
+async def test_long_request_is_transcribed_alone() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {"audio": _audio(), "language": "en"},
+            {"audio": _audio(seconds=31), "language": "en"},
+            {"audio": _audio(), "language": "en"},
+        ],
+    )
+
+    assert texts == [" batched", " alone", " batched"]
+    assert model.transcribe_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_empty_audio() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {"audio": _audio(), "language": "en"},
+            {"audio": _audio(seconds=0), "language": "en"},
+            {"audio": _audio(), "language": "en"},
+        ],
+    )
+
+    assert texts == [" batched", "", " batched"]
+    assert len(model.model.prompts[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_no_speech_in_batch() -> None:
+    model = FakeWhisperModel()
+    segments: List[str] = []
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {
+                "audio": _audio(_SILENCE),
+                "language": "en",
+                "on_segment": segments.append,
+            },
+            {"audio": _audio(), "language": "en"},
+        ],
+    )
+
+    assert texts == ["", " batched"]
+    assert not segments
+    assert model.transcribe_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_unlikely_batch_result_falls_back() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [
+            {"audio": _audio(_UNLIKELY), "language": "en"},
+            {"audio": _audio(), "language": "en"},
+        ],
+    )
+
+    assert texts == [" alone", " batched"]
+    assert model.transcribe_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_request_only_fails_itself() -> None:
+    model = FakeWhisperModel()
+    texts = await _transcribe_all(
+        _make_dispatcher(model),
+        [{"audio": _audio(), "language": "en"}, {"audio": _audio(), "language": "xx"}],
+    )
+
+    assert texts[0] == " alone"
+    assert isinstance(texts[1], ValueError)
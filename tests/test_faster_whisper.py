@@ -8,7 +8,13 @@ from asyncio.subprocess import PIPE
 from pathlib import Path
 
 import pytest
-from wyoming.asr import Transcribe, Transcript
+from wyoming.asr import (
+    Transcribe,
+    Transcript,
+    TranscriptChunk,
+    TranscriptStart,
+    TranscriptStop,
+)
 from wyoming.audio import AudioStart, AudioStop, wav_to_chunks
 from wyoming.event import async_read_event, async_write_event
 from wyoming.info import Describe, Info
@@ -16,7 +22,6 @@ from wyoming.info import Describe, Info
 _DIR = Path(__file__).parent
 _PROGRAM_DIR = _DIR.parent
 _LOCAL_DIR = _PROGRAM_DIR / "local"
-_SAMPLES_PER_CHUNK = 1024
 
 # Need to give time for the model to download
 _START_TIMEOUT = 60
@@ -61,6 +66,7 @@ async def test_faster_whisper() -> None:
         assert any(
             m.name == "tiny-int8" for m in asr.models
         ), "Expected tiny-int8 model"
+        assert asr.supports_transcript_streaming, "Expected transcript streaming"
         break
 
     # We want to use the whisper model
@@ -76,25 +82,47 @@ async def test_faster_whisper() -> None:
             ).event(),
             proc.stdin,
         )
-        for chunk in wav_to_chunks(example_wav, _SAMPLES_PER_CHUNK):
+        # 500 ms chunks at the WAV's own sample rate
+        samples_per_chunk = example_wav.getframerate() // 2
+        for chunk in wav_to_chunks(example_wav, samples_per_chunk):
             await async_write_event(chunk.event(), proc.stdin)
 
         await async_write_event(AudioStop().event(), proc.stdin)
 
+    # Streamed segments, then the full transcript for non-streaming clients
+    event = await asyncio.wait_for(
+        async_read_event(proc.stdout), timeout=_TRANSCRIBE_TIMEOUT
+    )
+    assert event is not None
+    assert TranscriptStart.is_type(event.type), "Expected transcript-start"
+    assert TranscriptStart.from_event(event).language == "en"
+
+    chunk_texts = []
     while True:
         event = await asyncio.wait_for(
             async_read_event(proc.stdout), timeout=_TRANSCRIBE_TIMEOUT
         )
         assert event is not None
 
-        if not Transcript.is_type(event.type):
-            continue
+        if not TranscriptChunk.is_type(event.type):
+            break
 
-        transcript = Transcript.from_event(event)
-        text = transcript.text.lower().strip()
-        text = re.sub(r"[^a-z ]", "", text)
-        assert text == "turn on the living room lamp"
-        break
+        chunk_texts.append(TranscriptChunk.from_event(event).text)
+
+    assert chunk_texts, "Expected at least one transcript-chunk"
+    assert Transcript.is_type(event.type), "Expected transcript after chunks"
+    transcript = Transcript.from_event(event)
+    assert transcript.text == " ".join(chunk_texts)
+
+    text = transcript.text.lower().strip()
+    text = re.sub(r"[^a-z ]", "", text)
+    assert text == "turn on the living room lamp"
+
+    event = await asyncio.wait_for(
+        async_read_event(proc.stdout), timeout=_TRANSCRIBE_TIMEOUT
+    )
+    assert event is not None
+    assert TranscriptStop.is_type(event.type), "Expected transcript-stop"
 
     # Need to close stdin for graceful termination
     proc.stdin.close()
@@ -0,0 +1,112 @@
+"""Tests for command-line defaults in wyoming-faster-whisper"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import ctranslate2
+import pytest
+
+from wyoming_faster_whisper.__main__ import get_compute_type, get_cpu_threads
+
+
+def _set_physical_cores(monkeypatch: pytest.MonkeyPatch, cores) -> None:
+    monkeypatch.setitem(
+        sys.modules,
+        "psutil",
+        SimpleNamespace(cpu_count=lambda logical=True: cores),
+    )
+
+
+def _set_allowed_cpus(monkeypatch: pytest.MonkeyPatch, cpus: int) -> None:
+    monkeypatch.setattr(
+        os, "sched_getaffinity", lambda _pid: set(range(cpus)), raising=False
+    )
+
+
+def test_cpu_threads_limited_by_affinity(monkeypatch: pytest.MonkeyPatch) -> None:
+    _set_physical_cores(monkeypatch, 32)
+    _set_allowed_cpus(monkeypatch, 2)
+
+    assert get_cpu_threads() == 2
+
+
+def test_cpu_threads_physical_cores(monkeypatch: pytest.MonkeyPatch) -> None:
+    _set_physical_cores(monkeypatch, 4)
+    _set_allowed_cpus(monkeypatch, 8)
+
+    assert get_cpu_threads() == 4
+
+
+def test_cpu_threads_unknown_physical_cores(monkeypatch: pytest.MonkeyPatch) -> None:
+    _set_physical_cores(monkeypatch, None)
+    _set_allowed_cpus(monkeypatch, 3)
+
+    assert get_cpu_threads() == 3
+
+
+def test_cpu_threads_without_psutil(monkeypatch: pytest.MonkeyPatch) -> None:
+    # None in sys.modules makes "import psutil" raise ImportError
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    _set_allowed_cpus(monkeypatch, 3)
+
+    assert get_cpu_threads() == 3
+
+
+def test_cpu_threads_without_affinity(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    _set_physical_cores(monkeypatch, 6)
+
+    assert get_cpu_threads() == 6
+
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    monkeypatch.setattr(os, "cpu_count", lambda: 5)
+
+    assert get_cpu_threads() == 5
+
+
+def _set_devices(monkeypatch: pytest.MonkeyPatch, cuda_devices: int, **supported):
+    monkeypatch.setattr(ctranslate2, "get_cuda_device_count", lambda: cuda_devices)
+    monkeypatch.setattr(
+        ctranslate2,
+        "get_supported_compute_types",
+        lambda device: set(supported.get(device, [])),
+    )
+
+
+@pytest.mark.parametrize(
+    ("supported", "expected"),
+    [
+        (["int8_bfloat16", "int8_float16", "float16", "int8"], "int8_bfloat16"),
+        (["int8_float16", "float16", "int8", "float32"], "int8_float16"),
+        (["float16", "int8", "float32"], "float16"),
+        (["int8", "float32"], "int8"),
+        (["float32"], "default"),
+    ],
+)
+def test_cuda_compute_type(monkeypatch: pytest.MonkeyPatch, supported, expected):
+    _set_devices(monkeypatch, 1, cuda=supported)
+
+    assert get_compute_type("cuda") == expected
+
+
+@pytest.mark.parametrize(
+    ("supported", "expected"),
+    [
+        (["int8", "int8_float32", "float32"], "int8"),
+        (["float32"], "float32"),
+        ([], "default"),
+    ],
+)
+def test_cpu_compute_type(monkeypatch: pytest.MonkeyPatch, supported, expected):
+    _set_devices(monkeypatch, 0, cpu=supported)
+
+    assert get_compute_type("cpu") == expected
+
+
+def test_auto_compute_type(monkeypatch: pytest.MonkeyPatch) -> None:
+    _set_devices(monkeypatch, 1, cuda=["float16", "int8"], cpu=["float32"])
+    assert get_compute_type("auto") == "float16"
+
+    _set_devices(monkeypatch, 0, cuda=["float16", "int8"], cpu=["float32"])
+    assert get_compute_type("auto") == "float32"
@@ -1,20 +1,36 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import io
 import logging
+import os
 import platform
-import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from typing import TYPE_CHECKING, List, Optional
 
-import faster_whisper
+from wyoming.event import write_event
 from wyoming.info import AsrModel, AsrProgram, Attribution, Info
 from wyoming.server import AsyncServer
 
 from . import __version__
-from .handler import FasterWhisperEventHandler
+
+if TYPE_CHECKING:
+    import faster_whisper
 
 _LOGGER = logging.getLogger(__name__)
 
+_MACHINE = platform.machine().lower()
+_IS_ARM = ("arm" in _MACHINE) or ("aarch" in _MACHINE)
+
+# tiny-int8, tiny.int8, etc.
+_INT8_MODEL_SIZES = {
+    f"{size}{sep}int8": size
+    for size in ("tiny", "base", "small", "medium")
+    for sep in ("-", ".")
+}
+
 
 async def main() -> None:
     """Main entry point."""
@@ -35,6 +51,11 @@ async def main() -> None:
         "--download-dir",
         help="Directory to download models into (default: first data dir)",
     )
+    parser.add_argument(
+        "--local-files-only",
+        action="store_true",
+        help="Don't download models, only use what's in the data directories",
+    )
     parser.add_argument(
         "--device",
         default="cpu",
@@ -46,19 +67,54 @@ async def main() -> None:
     )
     parser.add_argument(
         "--compute-type",
-        default="default",
-        help="Compute type (float16, int8, etc.)",
+        default="auto",
+        help="Compute type (float16, int8, etc.) or auto to select for device (default: auto)",
     )
     parser.add_argument(
         "--beam-size",
         type=int,
-        default=5,
-        help="Size of beam during decoding (0 for auto)",
+        default=1,
+        help="Size of beam during decoding (1 for greedy, 0 for auto)",
     )
     parser.add_argument(
         "--initial-prompt",
         help="Optional text to provide as a prompt for the first window",
     )
+    parser.add_argument(
+        "--vad-filter",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Remove non-speech audio with Silero VAD before transcribing (default: on)",
+    )
+    parser.add_argument(
+        "--vad-min-silence-ms",
+        type=int,
+        default=500,
+        help="Milliseconds of silence that end a speech chunk for VAD (default: 500)",
+    )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=0,
+        help="Number of CPU threads for inference (0 for available physical cores, or available CPUs without psutil)",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=8,
+        help="Maximum number of requests to transcribe together (default: 8)",
+    )
+    parser.add_argument(
+        "--batch-wait-ms",
+        type=int,
+        default=0,
+        help="Milliseconds to wait for more requests to batch (default: 0)",
+    )
+    parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Don't run a silent transcription at startup to warm up the model",
+    )
     #
     parser.add_argument("--debug", action="store_true", help="Log DEBUG messages")
     parser.add_argument(
@@ -81,30 +137,75 @@ async def main() -> None:
     )
     _LOGGER.debug(args)
 
+    # Deferred so --help and --version don't load CTranslate2 or ONNX runtime
+    import ctranslate2
+    import faster_whisper
+
+    from .dispatcher import BatchDispatcher
+    from .handler import FasterWhisperEventHandler
+
     # Automatic configuration for ARM
-    machine = platform.machine().lower()
-    is_arm = ("arm" in machine) or ("aarch" in machine)
     if args.model == "auto":
-        args.model = "tiny-int8" if is_arm else "base-int8"
+        args.model = "tiny-int8" if _IS_ARM else "base-int8"
         _LOGGER.debug("Model automatically selected: %s", args.model)
 
     if args.beam_size <= 0:
-        args.beam_size = 1 if is_arm else 5
+        args.beam_size = 1
         _LOGGER.debug("Beam size automatically selected: %s", args.beam_size)
 
     # Resolve model name
     model_name = args.model
-    match = re.match(r"^(tiny|base|small|medium)[.-]int8$", args.model)
-    if match:
+    model_size = _INT8_MODEL_SIZES.get(args.model)
+    if model_size is not None:
         # Original models re-uploaded to huggingface
-        model_size = match.group(1)
         model_name = f"{model_size}-int8"
         args.model = f"rhasspy/faster-whisper-{model_name}"
 
+    if args.cpu_threads <= 0:
+        args.cpu_threads = get_cpu_threads()
+        _LOGGER.debug("CPU threads automatically selected: %s", args.cpu_threads)
+
+    if args.compute_type == "auto":
+        args.compute_type = get_compute_type(args.device)
+        _LOGGER.info("Compute type automatically selected: %s", args.compute_type)
+    elif args.device.startswith("cuda") and (args.compute_type == "float16"):
+        _LOGGER.info(
+            "Consider --compute-type int8_float16 (or auto) for faster inference"
+        )
+
     if args.language == "auto":
         # Whisper does not understand "auto"
         args.language = None
 
+    # Load model
+    model_path = get_model_path(
+        args.model, args.data_dir, args.download_dir, args.local_files_only
+    )
+    _LOGGER.debug("Loading %s from %s", args.model, model_path)
+
+    if args.device != "cpu":
+        # Stream-ordered allocator; must be set before the first CUDA allocation
+        os.environ.setdefault("CT2_CUDA_ALLOCATOR", "cuda_malloc_async")
+
+    whisper_model = faster_whisper.WhisperModel(
+        model_path,
+        device=args.device,
+        compute_type=args.compute_type,
+        cpu_threads=args.cpu_threads,
+        # Requests are serialized by the dispatcher
+        num_workers=1,
+    )
+
+    # Makes it obvious when a faster compute type is unavailable on the device
+    _LOGGER.info(
+        "Model loaded on %s with compute type %s (supported: %s)",
+        whisper_model.model.device,
+        whisper_model.model.compute_type,
+        ", ".join(
+            sorted(ctranslate2.get_supported_compute_types(whisper_model.model.device))
+        ),
+    )
+
     wyoming_info = Info(
         asr=[
             AsrProgram(
@@ -116,6 +217,7 @@ async def main() -> None:
                 ),
                 installed=True,
                 version=__version__,
+                supports_transcript_streaming=True,
                 models=[
                     AsrModel(
                         name=model_name,
@@ -125,7 +227,7 @@ async def main() -> None:
                             url="https://huggingface.co/Systran",
                         ),
                         installed=True,
-                        languages=faster_whisper.tokenizer._LANGUAGE_CODES,  # pylint: disable=protected-access
+                        languages=whisper_model.supported_languages,
                         version=faster_whisper.__version__,
                     )
                 ],
@@ -133,35 +235,169 @@ async def main() -> None:
         ],
     )
 
-    # Load model
-    _LOGGER.debug("Loading %s", args.model)
-    whisper_model = faster_whisper.WhisperModel(
-        args.model,
-        download_root=args.download_dir,
-        device=args.device,
-        compute_type=args.compute_type,
+    # Info never changes, so serialize it once for all clients
+    with io.BytesIO() as wyoming_info_io:
+        write_event(wyoming_info.event(), wyoming_info_io)
+        wyoming_info_bytes = wyoming_info_io.getvalue()
+
+    # All model calls happen on a single thread outside of the event loop
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+    if not args.no_warmup:
+        # Move one-time kernel/allocator setup out of the first request
+        _LOGGER.debug("Warming up model")
+        await asyncio.get_running_loop().run_in_executor(
+            executor,
+            partial(
+                warm_up_model,
+                whisper_model,
+                args.language,
+                vad_filter=args.vad_filter,
+            ),
+        )
+
+    dispatcher = BatchDispatcher(
+        whisper_model,
+        beam_size=args.beam_size,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.batch_wait_ms,
+        vad_filter=args.vad_filter,
+        vad_min_silence_ms=args.vad_min_silence_ms,
+        executor=executor,
     )
 
     server = AsyncServer.from_uri(args.uri)
     _LOGGER.info("Ready")
-    model_lock = asyncio.Lock()
-    await server.run(
-        partial(
-            FasterWhisperEventHandler,
-            wyoming_info,
-            args,
-            whisper_model,
-            model_lock,
-            initial_prompt=args.initial_prompt,
-        )
-    )
+    try:
+        # Server stops if the dispatcher fails
+        async with asyncio.TaskGroup() as task_group:
+            dispatcher_task = task_group.create_task(dispatcher.run())
+            await server.run(
+                partial(
+                    FasterWhisperEventHandler,
+                    wyoming_info_bytes,
+                    args,
+                    dispatcher,
+                    initial_prompt=args.initial_prompt,
+                )
+            )
+            dispatcher_task.cancel()
+    finally:
+        executor.shutdown(wait=False)
 
 
 # -----------------------------------------------------------------------------
 
 
+def get_compute_type(device: str) -> str:
+    """Select the fastest quantized compute type supported by a device."""
+    import ctranslate2
+
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+
+    if device == "cuda":
+        # int8 weights with 16-bit activations.
+        # bfloat16 is only reported as supported on compute capability 8.0+.
+        preferred_types = ["int8_bfloat16", "int8_float16", "float16", "int8"]
+    else:
+        preferred_types = ["int8", "float32"]
+
+    supported_types = ctranslate2.get_supported_compute_types(device)
+    for compute_type in preferred_types:
+        if compute_type in supported_types:
+            return compute_type
+
+    return "default"
+
+
+def get_model_path(
+    model: str, data_dirs: List[str], download_dir: str, local_files_only: bool
+) -> str:
+    """Get the directory of a model, downloading it if it's not in a data dir."""
+    import faster_whisper
+
+    if os.path.isdir(model):
+        return model
+
+    for data_dir in data_dirs:
+        try:
+            # Skips checking the hub for updates when already downloaded
+            return faster_whisper.download_model(
+                model, local_files_only=True, cache_dir=data_dir
+            )
+        except FileNotFoundError:
+            pass
+
+    return faster_whisper.download_model(
+        model, local_files_only=local_files_only, cache_dir=download_dir
+    )
+
+
+def get_cpu_threads() -> int:
+    """Get the number of CPU threads to use for inference.
+
+    Physical cores if psutil is installed, but never more than the CPUs this
+    process is allowed to run on.
+    """
+    available_cpus: Optional[int] = None
+    if hasattr(os, "sched_getaffinity"):
+        # Respects CPU affinity and cpusets, e.g. in containers (Linux)
+        available_cpus = len(os.sched_getaffinity(0))
+
+    physical_cores: Optional[int] = None
+    try:
+        # Physical cores avoid hyperthreads competing for the same units
+        import psutil
+
+        physical_cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        pass
+
+    if physical_cores and available_cpus:
+        return min(physical_cores, available_cpus)
+
+    return physical_cores or available_cpus or os.cpu_count() or 4
+
+
+def warm_up_model(
+    whisper_model: "faster_whisper.WhisperModel",
+    language: Optional[str],
+    vad_filter: bool = False,
+) -> None:
+    """Transcribe one second of silence to initialize the model."""
+    import numpy as np
+
+    audio = np.zeros(16000, dtype=np.float32)
+    segments, _info = whisper_model.transcribe(
+        audio, beam_size=1, language=language, vad_filter=False
+    )
+    for _segment in segments:
+        pass
+
+    if vad_filter:
+        # Load the Silero VAD session too
+        segments, _info = whisper_model.transcribe(
+            audio, beam_size=1, language=language, vad_filter=True
+        )
+        for _segment in segments:
+            pass
+
+
 def run() -> None:
-    asyncio.run(main())
+    if sys.version_info < (3, 11):
+        sys.exit("Python 3.11 or later is required")
+
+    try:
+        # Faster event loop, if installed
+        import uvloop
+
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(main())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+"""Batches concurrent transcription requests for the model."""
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+import faster_whisper
+import numpy as np
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_compression_ratio, get_suppressed_tokens
+from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
+
+_LOGGER = logging.getLogger(__name__)
+
+# Same defaults as WhisperModel.transcribe
+_NO_SPEECH_THRESHOLD = 0.6
+_LOG_PROB_THRESHOLD = -1.0
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+
+
+@dataclass
+class TranscriptionRequest:
+    """Audio waiting to be transcribed."""
+
+    audio: np.ndarray
+    language: Optional[str]
+    initial_prompt: Optional[str]
+    future: "asyncio.Future[str]"
+    on_segment: Optional[Callable[[str], None]] = None
+
+    def emit_segment(self, text: str) -> None:
+        """Pass segment text to the callback on the event loop thread."""
+        if self.on_segment is not None:
+            self.future.get_loop().call_soon_threadsafe(self.on_segment, text)
+
+
+class BatchDispatcher:
+    """Coalesces requests that arrive close together into one model call.
+
+    A single request is transcribed exactly as before. When several requests
+    are waiting, their audio is encoded and decoded as one batch. Batched
+    results get the same no-speech check as transcribe, and results that
+    would need temperature fallback are transcribed again on their own.
+    """
+
+    def __init__(
+        self,
+        model: faster_whisper.WhisperModel,
+        beam_size: int,
+        max_batch_size: int = 8,
+        max_wait_ms: int = 0,
+        vad_filter: bool = True,
+        vad_min_silence_ms: int = 500,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.model = model
+        self.beam_size = beam_size
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.vad_filter = vad_filter
+        self.vad_options = VadOptions(min_silence_duration_ms=vad_min_silence_ms)
+        self.executor = executor
+        self._queue: "asyncio.Queue[TranscriptionRequest]" = asyncio.Queue()
+
+        # Only used on the executor thread
+        self._tokenizers: Dict[Optional[str], Tokenizer] = {}
+        self._suppress_tokens: Optional[List[int]] = None
+
+    async def transcribe(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        initial_prompt: Optional[str] = None,
+        on_segment: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Queue 16kHz float32 audio for transcription and wait for the text.
+
+        on_segment is called with the text of each segment as it is decoded.
+        """
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        await self._queue.put(
+            TranscriptionRequest(audio, language, initial_prompt, future, on_segment)
+        )
+        return await future
+
+    async def run(self) -> None:
+        """Transcribe batches of queued requests until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_seconds
+            while len(requests) < self.max_batch_size:
+                if not self._queue.empty():
+                    # Queued up while the model was busy with the last batch
+                    requests.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    requests.append(
+                        await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # Model releases the GIL, so the event loop keeps reading audio
+                results = await loop.run_in_executor(
+                    self.executor, self._transcribe_requests, requests
+                )
+            except Exception as err:
+                _LOGGER.exception("Unexpected error during transcription")
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(err)
+                continue
+
+            for request, result in zip(requests, results):
+                if request.future.done():
+                    continue
+
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+
+    def _transcribe_requests(
+        self, requests: List[TranscriptionRequest]
+    ) -> List[Union[str, Exception]]:
+        """Transcribe requests, batching those that fit in one 30 second window.
+
+        Errors are returned per request, so a bad request only fails itself.
+        """
+        if len(requests) == 1:
+            return [self._transcribe_alone(requests[0], vad_filter=self.vad_filter)]
+
+        for request in requests:
+            if self.vad_filter:
+                # Same filtering as transcribe, but done before batching
+                speech_chunks = get_speech_timestamps(request.audio, self.vad_options)
+                audio_chunks, _chunks_metadata = collect_chunks(
+                    request.audio, speech_chunks
+                )
+                request.audio = np.concatenate(audio_chunks)
+
+        # Long audio needs the sequential decoding in transcribe, and prompts
+        # must have the same length to be decoded together.
+        n_samples = self.model.feature_extractor.n_samples
+        batches: Dict[Optional[str], List[int]] = defaultdict(list)
+        for i, request in enumerate(requests):
+            if len(request.audio) <= n_samples:
+                batches[request.initial_prompt].append(i)
+
+        # No speech left after filtering
+        results: Dict[int, Union[str, Exception]] = {
+            i: "" for i, request in enumerate(requests) if len(request.audio) == 0
+        }
+        for batch_idxs in batches.values():
+            batch_idxs = [i for i in batch_idxs if i not in results]
+            if len(batch_idxs) < 2:
+                continue
+
+            _LOGGER.debug("Transcribing batch of %s request(s)", len(batch_idxs))
+            try:
+                batch_texts = self._transcribe_batch([requests[i] for i in batch_idxs])
+            except Exception as err:
+                # Transcribed one at a time below
+                _LOGGER.warning(
+                    "Batch of %s request(s) failed, retrying separately: %s",
+                    len(batch_idxs),
+                    err,
+                )
+                continue
+
+            for i, text in zip(batch_idxs, batch_texts):
+                if text is None:
+                    # Needs temperature fallback from transcribe below
+                    continue
+
+                if text:
+                    requests[i].emit_segment(text)
+
+                results[i] = text
+
+        for i, request in enumerate(requests):
+            if i not in results:
+                results[i] = self._transcribe_alone(request, vad_filter=False)
+
+        return [results[i] for i in range(len(requests))]
+
+    def _transcribe_alone(
+        self, request: TranscriptionRequest, vad_filter: bool
+    ) -> Union[str, Exception]:
+        """Transcribe a single request, returning any error instead of raising."""
+        try:
+            return self._transcribe_one(request, vad_filter=vad_filter)
+        except Exception as err:
+            _LOGGER.exception("Unexpected error during transcription")
+            return err
+
+    def _transcribe_one(self, request: TranscriptionRequest, vad_filter: bool) -> str:
+        segments, _info = self.model.transcribe(
+            request.audio,
+            beam_size=self.beam_size,
+            language=request.language,
+            initial_prompt=request.initial_prompt,
+            vad_filter=vad_filter,
+            vad_parameters=self.vad_options,
+        )
+
+        texts = []
+        for segment in segments:
+            request.emit_segment(segment.text)
+            texts.append(segment.text)
+
+        return " ".join(texts)
+
+    def _transcribe_batch(
+        self, requests: List[TranscriptionRequest]
+    ) -> List[Optional[str]]:
+        """Decode requests together, with None for results that need fallback."""
+        model = self.model
+        features = np.stack(
+            [
+                pad_or_trim(model.feature_extractor(request.audio))
+                for request in requests
+            ]
+        )
+        encoder_output = model.encode(features)
+
+        languages = [request.language for request in requests]
+        if not model.model.is_multilingual:
+            languages = ["en"] * len(requests)
+        elif any(language is None for language in languages):
+            # Top language token for each item, like <|en|>
+            detected = model.model.detect_language(encoder_output)
+            languages = [
+                language or item_probs[0][0][2:-2]
+                for language, item_probs in zip(languages, detected)
+            ]
+
+        tokenizers = [self._get_tokenizer(language) for language in languages]
+        if self._suppress_tokens is None:
+            # Same for every language
+            self._suppress_tokens = get_suppressed_tokens(tokenizers[0], [-1])
+
+        prompts = []
+        for request, tokenizer in zip(requests, tokenizers):
+            previous_tokens = []
+            if request.initial_prompt:
+                previous_tokens = tokenizer.encode(" " + request.initial_prompt.strip())
+
+            prompts.append(
+                model.get_prompt(
+                    tokenizer, previous_tokens=previous_tokens, without_timestamps=True
+                )
+            )
+
+        results = model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=self.beam_size,
+            max_length=model.max_length,
+            suppress_blank=True,
+            suppress_tokens=self._suppress_tokens,
+            return_scores=True,
+            return_no_speech_prob=True,
+        )
+
+        texts: List[Optional[str]] = []
+        for tokenizer, result in zip(tokenizers, results):
+            tokens = result.sequences_ids[0]
+
+            # Recover the average log prob from the returned score
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+
+            if (result.no_speech_prob > _NO_SPEECH_THRESHOLD) and (
+                avg_logprob <= _LOG_PROB_THRESHOLD
+            ):
+                # Silence, skipped by transcribe too
+                texts.append("")
+                continue
+
+            text = tokenizer.decode(tokens)
+            if (get_compression_ratio(text.strip()) > _COMPRESSION_RATIO_THRESHOLD) or (
+                avg_logprob < _LOG_PROB_THRESHOLD
+            ):
+                # Too repetitive or unlikely
+                texts.append(None)
+            else:
+                texts.append(text)
+
+        return texts
+
+    def _get_tokenizer(self, language: Optional[str]) -> Tokenizer:
+        """Reuse tokenizers so their token lookups are only done once."""
+        tokenizer = self._tokenizers.get(language)
+        if tokenizer is None:
+            tokenizer = Tokenizer(
+                self.model.hf_tokenizer,
+                self.model.model.is_multilingual,
+                task="transcribe",
+                language=language,
+            )
+            self._tokenizers[language] = tokenizer
+
+        return tokenizer
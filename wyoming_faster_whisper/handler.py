@@ -2,19 +2,31 @@
 import argparse
 import asyncio
 import logging
-import os
-import tempfile
-import wave
 from typing import Optional
 
-import faster_whisper
-from wyoming.asr import Transcribe, Transcript
-from wyoming.audio import AudioChunk, AudioStop
+import numpy as np
+from wyoming.asr import (
+    Transcribe,
+    Transcript,
+    TranscriptChunk,
+    TranscriptStart,
+    TranscriptStop,
+)
+from wyoming.audio import AudioChunk, AudioChunkConverter, AudioStop
 from wyoming.event import Event
-from wyoming.info import Describe, Info
+from wyoming.info import Describe
 from wyoming.server import AsyncEventHandler
 
+from .dispatcher import BatchDispatcher
+
+try:
+    # Faster resampling, if installed
+    import soxr
+except ImportError:
+    soxr = None  # type: ignore[assignment]
+
 _LOGGER = logging.getLogger(__name__)
+_RATE = 16000
 
 
 class FasterWhisperEventHandler(AsyncEventHandler):
@@ -22,10 +34,9 @@ class FasterWhisperEventHandler(AsyncEventHandler):
 
     def __init__(
         self,
-        wyoming_info: Info,
+        wyoming_info_bytes: bytes,
         cli_args: argparse.Namespace,
-        model: faster_whisper.WhisperModel,
-        model_lock: asyncio.Lock,
+        dispatcher: BatchDispatcher,
         *args,
         initial_prompt: Optional[str] = None,
         **kwargs,
@@ -33,26 +44,32 @@ class FasterWhisperEventHandler(AsyncEventHandler):
         super().__init__(*args, **kwargs)
 
         self.cli_args = cli_args
-        self.wyoming_info_event = wyoming_info.event()
-        self.model = model
-        self.model_lock = model_lock
+        self.wyoming_info_bytes = wyoming_info_bytes
+        self.dispatcher = dispatcher
         self.initial_prompt = initial_prompt
         self._language = self.cli_args.language
-        self._wav_dir = tempfile.TemporaryDirectory()
-        self._wav_path = os.path.join(self._wav_dir.name, "speech.wav")
-        self._wav_file: Optional[wave.Wave_write] = None
+        self._audio_converter = _make_audio_converter()
+        self._resampler: "Optional[soxr.ResampleStream]" = None
+        self._audio = bytearray()
 
     async def handle_event(self, event: Event) -> bool:
         if AudioChunk.is_type(event.type):
-            chunk = AudioChunk.from_event(event)
-
-            if self._wav_file is None:
-                self._wav_file = wave.open(self._wav_path, "wb")
-                self._wav_file.setframerate(chunk.rate)
-                self._wav_file.setsampwidth(chunk.width)
-                self._wav_file.setnchannels(chunk.channels)
+            # Passes through chunks that are already 16kHz 16-bit mono
+            chunk = self._audio_converter.convert(AudioChunk.from_event(event))
+            if chunk.rate == _RATE:
+                self._audio.extend(chunk.audio)
+                return True
+
+            if self._resampler is None:
+                self._resampler = soxr.ResampleStream(
+                    chunk.rate, _RATE, 1, dtype="int16"
+                )
 
-            self._wav_file.writeframes(chunk.audio)
+            self._audio.extend(
+                self._resampler.resample_chunk(
+                    np.frombuffer(chunk.audio, dtype=np.int16)
+                ).tobytes()
+            )
             return True
 
         if AudioStop.is_type(event.type):
@@ -60,27 +77,52 @@ class FasterWhisperEventHandler(AsyncEventHandler):
                 "Audio stopped. Transcribing with initial prompt=%s",
                 self.initial_prompt,
             )
-            assert self._wav_file is not None
+            if self._resampler is not None:
+                # Samples still held in the resampler's filter
+                self._audio.extend(
+                    self._resampler.resample_chunk(
+                        np.empty(0, dtype=np.int16), last=True
+                    ).tobytes()
+                )
 
-            self._wav_file.close()
-            self._wav_file = None
+            # Cast and scale in one pass
+            audio = np.multiply(
+                np.frombuffer(self._audio, dtype=np.int16),
+                np.float32(1 / 32768),
+                dtype=np.float32,
+            )
 
-            async with self.model_lock:
-                segments, _info = self.model.transcribe(
-                    self._wav_path,
-                    beam_size=self.cli_args.beam_size,
+            # Stream segment text as it's decoded; None marks the end
+            segment_texts: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+            transcribe_task = asyncio.create_task(
+                self.dispatcher.transcribe(
+                    audio,
                     language=self._language,
                     initial_prompt=self.initial_prompt,
+                    on_segment=segment_texts.put_nowait,
                 )
+            )
+            transcribe_task.add_done_callback(
+                lambda _task: segment_texts.put_nowait(None)
+            )
 
-            text = " ".join(segment.text for segment in segments)
+            await self.write_event(TranscriptStart(language=self._language).event())
+            while (segment_text := await segment_texts.get()) is not None:
+                await self.write_event(TranscriptChunk(text=segment_text).event())
+
+            text = await transcribe_task
             _LOGGER.info(text)
 
+            # Full transcript for clients that don't support streaming
             await self.write_event(Transcript(text=text).event())
+            await self.write_event(TranscriptStop().event())
             _LOGGER.debug("Completed request")
 
             # Reset
             self._language = self.cli_args.language
+            self._audio_converter = _make_audio_converter()
+            self._resampler = None
+            self._audio = bytearray()
 
             return False
 
@@ -92,8 +134,17 @@ class FasterWhisperEventHandler(AsyncEventHandler):
             return True
 
         if Describe.is_type(event.type):
-            await self.write_event(self.wyoming_info_event)
+            # Pre-serialized info event
+            self.writer.write(self.wyoming_info_bytes)
+            await self.writer.drain()
             _LOGGER.debug("Sent info")
             return True
 
         return True
+
+
+def _make_audio_converter() -> AudioChunkConverter:
+    """Convert to 16-bit mono, leaving resampling to soxr when it's installed."""
+    return AudioChunkConverter(
+        rate=None if soxr is not None else _RATE, width=2, channels=1
+    )